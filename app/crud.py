@@ -1,88 +1,256 @@
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 from app import models
-from datetime import datetime
+from datetime import date, timedelta
 import pandas as pd
+import numpy as np
+import chardet
+import codecs
+import csv
 import logging
+import mmap
+import re
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional, CSV files are parsed by the C engine otherwise
+    pa = None
 
 logger = logging.getLogger(__name__)
 
+# Encodings and delimiters tried, in order, when reading a CSV file
+CSV_ENCODINGS = ['utf-8', 'latin1', 'ISO-8859-1']
+CSV_DELIMITERS = [',', ';', '\t']
+
+# Dtypes of the product columns of a CSV file
+CSV_DTYPES = {'Family': 'string', 'Product Name': 'string', 'Product ID': 'int64', 'Price': 'float64'}
+
+# Header of a monthly sales column, e.g. 2024-01
+_DATE_COL_RE = re.compile(r'^\d{4}-\d{2}$')
+
+# Number of bytes read from the start of a CSV file to detect its format
+CSV_SNIFF_BYTES = 64 * 1024
+
+# Number of rows sent to the database per bulk insert
+BULK_INSERT_BATCH_SIZE = 10000
+
 class ProductManager:
     def __init__(self, db: Session):
         self.db = db
+        # Lookups by id, kept for the lifetime of the manager (one request), including misses
+        self._product_cache = {}
+        self._family_cache = {}
+
+    def sniff_csv_format(self, file, delimiters: list) -> tuple:
+        """
+        Detect the encoding and delimiter of a CSV file, given as a path or a file object, from its first bytes.
+        Text file objects are already decoded and keep their own encoding.
+        """
+        if hasattr(file, 'read'):
+            sample = file.read(CSV_SNIFF_BYTES)
+            file.seek(0)
+        else:
+            with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                sample = mapped[:CSV_SNIFF_BYTES]
+
+        # Text streams are already decoded, so only their delimiter is detected
+        if isinstance(sample, str):
+            dialect = csv.Sniffer().sniff(sample, delimiters=''.join(delimiters))
+            return getattr(file, 'encoding', None) or 'utf-8', dialect.delimiter
+
+        # chardet is unreliable on short UTF-8 samples, so keep UTF-8 whenever the sample decodes as UTF-8
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            encoding = chardet.detect(sample)['encoding']
+        if encoding is None:
+            raise ValueError("No encoding detected.")
+
+        dialect = csv.Sniffer().sniff(sample.decode(encoding, errors='ignore'), delimiters=''.join(delimiters))
+        return encoding, dialect.delimiter
 
-    def read_csv_with_encoding(self, file_path: str, encodings: list, delimiters: list) -> pd.DataFrame:
+    def read_csv_with_encoding(self, file, encodings: list, delimiters: list) -> pd.DataFrame:
         """
-        Try to read the CSV file with a list of encodings and delimiters.
+        Read the CSV file, given as a path or a file object, with its detected encoding and delimiter.
+        Falls back to trying a list of encodings and delimiters when detection fails.
         """
-        for encoding in encodings:
-            for delimiter in delimiters:
-                try:
-                    return pd.read_csv(file_path, encoding=encoding, delimiter=delimiter, on_bad_lines='warn')
-                except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                    logger.warning(f"Parsing error with encoding {encoding} and delimiter {delimiter}: {e}")
+        # Paths the probe could map are memory-mapped for parsing too,
+        # so the parser reads the file without buffered copies
+        try:
+            candidates = [self.sniff_csv_format(file, delimiters)]
+            memory_map = not hasattr(file, 'read')
+        except (OSError, LookupError, ValueError, csv.Error) as e:
+            logger.warning(f"Unable to detect encoding and delimiter: {e}")
+            candidates = []
+            memory_map = False
+        candidates += [(encoding, delimiter) for encoding in encodings for delimiter in delimiters]
+
+        for encoding, delimiter in candidates:
+            try:
+                return self._read_csv(file, encoding, delimiter, memory_map)
+            except (UnicodeDecodeError, pd.errors.ParserError) as e:
+                logger.warning(f"Parsing error with encoding {encoding} and delimiter {delimiter}: {e}")
         raise Exception("Unable to read the file with provided encodings and delimiters.")
 
+    def _read_csv(self, file, encoding: str, delimiter: str, memory_map: bool) -> pd.DataFrame:
+        """
+        Read the CSV file with explicit column dtypes, taken from its header, instead of inferring them.
+        """
+        options = {'encoding': encoding, 'delimiter': delimiter, 'on_bad_lines': 'warn', 'engine': 'c'}
+
+        # Rewind file objects left mid-way by a failed attempt
+        self._rewind(file)
+        header = pd.read_csv(file, nrows=0, **options).columns
+        dtypes = {col: dtype for col, dtype in CSV_DTYPES.items() if col in header}
+        # Month quantities are floats so empty cells can stay NaN, in double precision so integers stay exact
+        dtypes.update({col: 'float64' for col in header if _DATE_COL_RE.match(col)})
+
+        # With pyarrow installed, parse into Arrow-backed columns. Its parser rejects malformed rows
+        # and values that do not fit their dtype, which the C parser below handles more leniently.
+        if pa is not None:
+            self._rewind(file)
+            try:
+                df = pd.read_csv(
+                    file, encoding=encoding, delimiter=delimiter, engine='pyarrow', dtype_backend='pyarrow',
+                    dtype={col: f'{dtype}[pyarrow]' for col, dtype in dtypes.items()}
+                )
+            except ValueError as e:
+                logger.warning(f"pyarrow could not parse the file, using the C parser instead: {e}")
+            else:
+                # Unlike the C parser, pyarrow reads empty text cells as '' instead of NA
+                for col in df.select_dtypes(include='string').columns:
+                    df[col] = df[col].replace('', pd.NA)
+                return df
+
+        self._rewind(file)
+        try:
+            return pd.read_csv(file, dtype=dtypes, memory_map=memory_map, low_memory=False, **options)
+        except (UnicodeDecodeError, pd.errors.ParserError):
+            raise
+        except ValueError as e:
+            logger.warning(f"Values do not match the expected column dtypes, inferring them instead: {e}")
+            self._rewind(file)
+            return pd.read_csv(file, memory_map=memory_map, **options)
+
+    def _rewind(self, file):
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
     def load_data(self, file_path: str):
-        encodings = ['utf-8', 'latin1', 'ISO-8859-1']
-        delimiters = [',', ';', '\t']
-        
         # Read the CSV file into a DataFrame
-        df = self.read_csv_with_encoding(file_path, encodings, delimiters)
-        
-        for _, row in df.iterrows():
-            family_name = row.get('Family')
-            if not family_name:
-                continue
-
-            # Get or create the family
-            family = self.db.query(models.Family).filter(models.Family.name == family_name).first()
-            if not family:
-                family = models.Family(name=family_name)
-                self.db.add(family)
-                self.db.commit()
-                self.db.refresh(family)
-            
-            # Check if the product already exists
-            product_id = row.get('Product ID')
-            existing_product = self.db.query(models.Product).filter(models.Product.id == product_id).first()
-            
-            if existing_product:
-                logger.info(f"Product with ID {product_id} already exists, skipping.")
-                continue  # Skip to the next product if it already exists
-
-            # Create the product if it doesn't exist
-            product = models.Product(
-                name=row.get('Product Name'),
-                id=product_id,
-                price=row.get('Price'),
-                family_id=family.id
+        df = self.read_csv_with_encoding(file_path, CSV_ENCODINGS, CSV_DELIMITERS)
+        self.load_dataframe(df)
+
+    def load_data_stream(self, fileobj):
+        """
+        Load data from an open CSV file object, such as an upload, without writing it to disk.
+        """
+        df = self.read_csv_with_encoding(fileobj, CSV_ENCODINGS, CSV_DELIMITERS)
+        self.load_dataframe(df)
+
+    def load_dataframe(self, df: pd.DataFrame):
+        """
+        Load families, products and monthly sales from a DataFrame read from a CSV file.
+        """
+        # Rename the columns to the names used in the database rows
+        df = df.rename(columns={
+            'Family': 'family',
+            'Product Name': 'product_name',
+            'Product ID': 'product_id',
+            'Price': 'price',
+        })
+
+        # Find the YYYY-MM month columns wherever they are, and parse each header once
+        is_month = df.columns.str.match(_DATE_COL_RE, na=False)
+        for col in df.columns[~is_month].difference(['family', 'product_name', 'product_id', 'price']):
+            logger.warning(f"Ignoring column '{col}': it does not match format '%Y-%m'")
+        month_columns = df.columns[is_month]
+        month_dates = pd.to_datetime(month_columns, format='%Y-%m', errors='coerce')
+        for month in month_columns[month_dates.isna()]:
+            logger.warning(f"Date parsing error: column '{month}' is not a valid month")
+        date_map = dict(zip(month_columns[month_dates.notna()], month_dates[month_dates.notna()].date))
+
+        # Rows without a family are skipped
+        df = df.dropna(subset=['family'])
+
+        # Get or create all families, with the ids of new ones returned by the INSERT itself
+        family_names = df['family'].unique().tolist()
+        family_id_by_name = self._get_family_ids(family_names)
+        missing_families = [name for name in family_names if name not in family_id_by_name]
+        if missing_families:
+            inserted = self.db.execute(
+                insert(models.Family).returning(models.Family.id, models.Family.name),
+                [{'name': name} for name in missing_families]
             )
-            self.db.add(product)
-            self.db.commit()
-            self.db.refresh(product)
-            
-            # Add sales data
-            for col in df.columns[4:]:
-                try:
-                    date = datetime.strptime(col, '%Y-%m')
-                    quantity = row.get(col, 0)
-                    # Ensure quantity is an integer
-                    quantity = int(quantity) if quantity else 0
-                    
-                    sales = models.Sales(
-                        product_id=product.id,
-                        date=date,
-                        quantity=quantity
-                    )
-                    self.db.add(sales)
-                except ValueError as e:
-                    logger.warning(f"Date parsing error: {e}")
+            family_id_by_name.update({name: family_id for family_id, name in inserted})
+
+        # Skip products that already exist, either in the database or earlier in the file
+        existing_product_ids = {
+            product_id for (product_id,) in self.db.query(models.Product.id).filter(
+                models.Product.id.in_(df['product_id'].tolist())
+            )
+        }
+        skipped = df['product_id'].isin(existing_product_ids) | df['product_id'].duplicated()
+        for product_id in df.loc[skipped, 'product_id']:
+            logger.info(f"Product with ID {product_id} already exists, skipping.")
+        df = df[~skipped]
+
+        product_rows = pd.DataFrame({
+            'id': df['product_id'],
+            'name': df['product_name'],
+            'price': df['price'],
+            'family_id': df['family'].map(family_id_by_name),
+        }).to_dict('records')
+
+        # Convert the month columns of the new products to one dense array in a single pass
+        quantities = df[list(date_map)].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+        # Lay the array out as one sales row per product and month, leaving out empty cells
+        n_products, n_months = quantities.shape
+        sold = ~np.isnan(quantities.ravel())
+        sold_quantities = quantities.ravel()[sold]
+        # Quantities that do not fit a 64-bit integer would wrap around when cast, so they are rejected
+        if not np.all(np.abs(sold_quantities) < 2.0 ** 63):
+            raise ValueError("Sales quantities must be finite and fit in a 64-bit integer.")
+        sales_rows = pd.DataFrame({
+            'product_id': np.repeat(df['product_id'].to_numpy(), n_months)[sold],
+            'date': np.tile(np.array(list(date_map.values()), dtype=object), n_products)[sold],
+            'quantity': sold_quantities.astype(np.int64),
+        }).to_dict('records')
+
+        # Insert products before their sales so the foreign keys resolve
+        self._bulk_insert(models.Product, product_rows)
+        self._bulk_insert(models.Sales, sales_rows)
                     
         # Commit all changes to the database
         self.db.commit()
 
+        # Ids that were missing before the load may exist now
+        self._product_cache.clear()
+        self._family_cache.clear()
+
+    def _get_family_ids(self, names: list) -> dict:
+        """
+        Map the given family names to the ids of the families that exist.
+        """
+        return {
+            name: family_id for family_id, name in self.db.query(models.Family.id, models.Family.name).filter(
+                models.Family.name.in_(names)
+            )
+        }
+
+    def _bulk_insert(self, model, rows: list):
+        """
+        Insert the given row mappings in batches of BULK_INSERT_BATCH_SIZE.
+        """
+        for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+            self.db.execute(insert(model), rows[start:start + BULK_INSERT_BATCH_SIZE])
+
     def get_product(self, product_id: int):
-        return self.db.query(models.Product).filter(models.Product.id == product_id).first()
+        if product_id not in self._product_cache:
+            self._product_cache[product_id] = self.db.get(models.Product, product_id)
+        return self._product_cache[product_id]
 
     def update_product(self, product_id: int, price: float):
         product = self.get_product(product_id)
@@ -93,12 +261,14 @@ class ProductManager:
         return None
 
     def get_family(self, family_id: int):
-        return self.db.query(models.Family).filter(models.Family.id == family_id).first()
+        if family_id not in self._family_cache:
+            self._family_cache[family_id] = self.db.get(models.Family, family_id)
+        return self._family_cache[family_id]
 
     def get_product_sales_last_year(self, product_id: int):
-        one_year_ago = datetime.now().replace(year=datetime.now().year - 1)
-        sales = self.db.query(models.Sales).filter(
+        # Compare dates with dates, so sales made exactly a year ago are included
+        one_year_ago = date.today() - timedelta(days=365)
+        return self.db.query(func.coalesce(func.sum(models.Sales.quantity), 0)).filter(
             models.Sales.product_id == product_id,
             models.Sales.date >= one_year_ago
-        ).all()
-        return sum(sale.quantity for sale in sales)
+        ).scalar()
@@ -10,8 +10,19 @@ load_dotenv()
 # Access the DATABASE_URL from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Create SQLAlchemy engine, letting psycopg2 send many-row inserts as
+# multi-VALUES statements in pages of 10k rows. The pool is sized for
+# concurrent requests, and connections are checked before use and
+# recycled every 30 minutes so stale ones never reach a request.
+engine = create_engine(
+    DATABASE_URL,
+    executemany_mode="values_plus_batch",
+    insertmanyvalues_page_size=10000,
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
 
 # Create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -2,9 +2,7 @@ from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, APIRouter
 from sqlalchemy.orm import Session
 from app import models, database
 from app.crud import ProductManager
-import shutil
 from sqlalchemy.exc import IntegrityError
-import os
 import logging
 
 app = FastAPI(
@@ -42,16 +40,10 @@ def load_data_endpoint(file: UploadFile = File(...), db: Session = Depends(datab
     Raises:
         HTTPException: If there's a database integrity error or any unexpected error occurs.
     """
-    file_location = f"/tmp/{file.filename}"
-    
     try:
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
         product_service = ProductManager(db)
-        product_service.load_data(file_location)
+        product_service.load_data_stream(file.file)
         
-        os.remove(file_location)
         return {"status": "success", "message": "Data loaded successfully"}
 
     except IntegrityError as e:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -18,6 +18,10 @@ class Product(Base):
     """Defines a product with name, price, associated family, and sales records."""
 
     __tablename__ = 'products'
+    __table_args__ = (
+        # Serves the family's product lookups
+        Index('ix_products_family', 'family_id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -33,6 +37,10 @@ class Sales(Base):
     """Records individual sales transactions for products, including date and quantity."""
 
     __tablename__ = 'sales'
+    __table_args__ = (
+        # Covers the per-product date range sums without reading the table
+        Index('ix_sales_product_date', 'product_id', 'date', 'quantity'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
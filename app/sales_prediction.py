@@ -1,9 +1,10 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sqlalchemy.orm import Session
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.linear_model import Ridge
+from sklearn.preprocessing import OneHotEncoder
 from typing import Tuple, List
 from app.database import get_db
 from app.models import Sales, Product
@@ -12,36 +13,40 @@ class SalesPredictor:
     def __init__(self, db: Session):
         self.db = db
         self.df = None
+        self.X = None
+        self.targets = None
         self.quantity_model = None
         self.revenue_model = None
         self.X_test_quantity = None
         self.y_test_quantity = None
+        self.product_id_test = None
         self.X_test_revenue = None
         self.y_test_revenue = None
+        self.y_pred_quantity = None
+        self.y_pred_revenue = None
 
     def load_sales_data(self) -> pd.DataFrame:
         """
         Fetches sales data from the database and preprocesses it into a pandas DataFrame.
         """
         try:
-            # Fetch sales data along with product price
-            sales_data = self.db.query(Sales, Product.price).join(Product, Sales.product_id == Product.id).all()
-            
-            # Convert to pandas DataFrame
-            df = pd.DataFrame([(sale[0].product_id, sale[0].date, sale[0].quantity, sale[1]) 
-                               for sale in sales_data], 
-                              columns=['product_id', 'date', 'quantity', 'price'])
+            # Fetch sales data along with product price straight into a DataFrame
+            query = self.db.query(Sales.product_id, Sales.date, Sales.quantity, Product.price).join(
+                Product, Sales.product_id == Product.id
+            )
+            df = pd.read_sql(query.statement, self.db.connection(), parse_dates=['date'])
             
             # Feature engineering: Convert date to numerical value (e.g., days since start)
-            df['date'] = pd.to_datetime(df['date'])
-            df['days_since_start'] = (df['date'] - df['date'].min()).dt.days
+            df['days_since_start'] = (df['date'] - df['date'].min()).dt.days.astype(np.int32)
             
-            # Calculate revenue as quantity * price
+            # Calculate revenue as quantity * price, in full precision since the report shows it as is
             df['revenue'] = df['quantity'] * df['price']
             
             # Sort by product_id and date
             df = df.sort_values(by=['product_id', 'date'])
             
+            # Features are built from this data on the first training
+            self.X = self.targets = None
             self.df = df
             return df
 
@@ -49,33 +54,52 @@ class SalesPredictor:
             print(f"Error loading sales data: {e}")
             raise
 
+    def _build_features(self) -> None:
+        """
+        Builds the feature matrix and the targets shared by both models, which only differ in their target.
+        """
+        # Features as a sparse float32 matrix: days since start plus one-hot encoded product ids,
+        # so memory grows with the number of rows rather than rows times products
+        product_features = OneHotEncoder(dtype=np.float32).fit_transform(self.df[['product_id']])
+        self.X = sparse.hstack(
+            [self.df[['days_since_start']].to_numpy(dtype=np.float32), product_features], format='csr'
+        )
+        self.targets = {
+            'quantity': self.df['quantity'].to_numpy(dtype=np.float32),
+            'revenue': self.df['revenue'].to_numpy(dtype=np.float32),
+        }
+
     def train_model(self, target: str) -> None:
         """
-        Trains a linear regression model to predict either quantity or revenue.
+        Trains a ridge regression model to predict either quantity or revenue.
         """
         try:
             if self.df is None:
                 raise ValueError("Sales data not loaded.")
-            
-            # Features
-            X = self.df[['days_since_start', 'product_id']]
-            y = self.df[target]
-            
-            # Split the data into training and testing sets
-            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-            
-            # Initialize and train the model
-            model = LinearRegression()
+            if self.X is None:
+                self._build_features()
+            
+            # Split the data into training and testing sets, keeping the product ids of the test rows
+            # and their original target values, so the report shows them as loaded rather than as float32
+            X_train, X_test, y_train, _, _, self.product_id_test, _, y_test = train_test_split(
+                self.X, self.targets[target], self.df['product_id'].to_numpy(), self.df[target].to_numpy(),
+                test_size=0.2, random_state=42
+            )
+            
+            # Initialize and train the model with an iterative solver
+            model = Ridge(solver='sparse_cg')
             model.fit(X_train, y_train)
             
             if target == 'quantity':
                 self.quantity_model = model
                 self.X_test_quantity = X_test
                 self.y_test_quantity = y_test
+                self.y_pred_quantity = None
             elif target == 'revenue':
                 self.revenue_model = model
                 self.X_test_revenue = X_test
                 self.y_test_revenue = y_test
+                self.y_pred_revenue = None
 
         except Exception as e:
             print(f"Error training {target} model: {e}")
@@ -100,13 +124,18 @@ class SalesPredictor:
             if model is None or X_test is None or y_test is None:
                 raise ValueError(f"{target.capitalize()} model not trained or test data not available.")
                 
-            # Predict using the test set
+            # Predict using the test set, keeping the predictions for the report
             y_pred = model.predict(X_test)
+            if target == 'quantity':
+                self.y_pred_quantity = y_pred
+            else:
+                self.y_pred_revenue = y_pred
             
-            # Calculate evaluation metrics
-            mae = mean_absolute_error(y_test, y_pred)
-            mse = mean_squared_error(y_test, y_pred)
-            rmse = np.sqrt(mse)
+            # Calculate evaluation metrics from the residuals
+            errors = np.asarray(y_test) - y_pred
+            mae = float(np.abs(errors).mean())
+            mse = float((errors ** 2).mean())
+            rmse = float(np.sqrt(mse))
             
             return mae, mse, rmse
 
@@ -122,23 +151,23 @@ class SalesPredictor:
             if self.quantity_model is None or self.revenue_model is None:
                 raise ValueError("Models are not trained.")
 
-            # Predict quantity and revenue
-            y_pred_quantity = self.quantity_model.predict(self.X_test_quantity)
-            y_pred_revenue = self.revenue_model.predict(self.X_test_revenue)
-            
-            # Compile the actual vs predicted DataFrame
-            report_data = {
-                'product_id': self.X_test_quantity['product_id'].values,
+            # Predict quantity and revenue, unless evaluate_model already did
+            if self.y_pred_quantity is None:
+                self.y_pred_quantity = self.quantity_model.predict(self.X_test_quantity)
+            if self.y_pred_revenue is None:
+                self.y_pred_revenue = self.revenue_model.predict(self.X_test_revenue)
+            
+            # Compile the actual vs predicted DataFrame, with error metrics for additional insight
+            # computed on the arrays so the frame is built in one go
+            report_df = pd.DataFrame({
+                'product_id': self.product_id_test,
                 'actual_quantity': self.y_test_quantity,
-                'predicted_quantity': y_pred_quantity,
+                'predicted_quantity': self.y_pred_quantity,
                 'actual_revenue': self.y_test_revenue,
-                'predicted_revenue': y_pred_revenue
-            }
-            report_df = pd.DataFrame(report_data)
-
-            # Generate error metrics for additional insight
-            report_df['quantity_error'] = report_df['actual_quantity'] - report_df['predicted_quantity']
-            report_df['revenue_error'] = report_df['actual_revenue'] - report_df['predicted_revenue']
+                'predicted_revenue': self.y_pred_revenue,
+                'quantity_error': self.y_test_quantity - self.y_pred_quantity,
+                'revenue_error': self.y_test_revenue - self.y_pred_revenue
+            })
             report_df.to_csv('output/prediction_report.csv', index=False)
             return report_df
 
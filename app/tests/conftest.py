@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+
+# Test database URL, an in-memory database shared through a single pooled connection
+SQLALCHEMY_DATABASE_URL = "sqlite://"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, join_transaction_mode="create_savepoint")
+
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    # Let SQLAlchemy emit BEGIN itself, so SAVEPOINTs work with pysqlite
+    dbapi_connection.isolation_level = None
+    # Keep journals and temporary tables off disk even if the URL points to a file
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+@event.listens_for(engine, "begin")
+def _begin_transaction(connection):
+    connection.exec_driver_sql("BEGIN")
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+
+@pytest.fixture(scope="function")
+def db():
+    # Each test runs in a transaction that is rolled back afterwards,
+    # commits in the code under test only release SAVEPOINTs
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = TestingSessionLocal(bind=connection)
+    try:
+        yield db
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
@@ -1,7 +1,4 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.database import Base
 from app.crud import ProductManager
 from app.models import Family, Product, Sales
 from datetime import datetime, timedelta
@@ -12,22 +9,6 @@ import io
 from unittest.mock import patch, mock_open
 
 
-# Test database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-@pytest.fixture(scope="function")
-def db():
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
-
 @pytest.fixture(scope="function")
 def product_manager(db):
     return ProductManager(db)
@@ -58,6 +39,26 @@ def test_read_csv_with_encoding_failure(product_manager):
         "Test exception"
     ]), f"Expected error message not found in: {error_message}"
 
+def test_sniff_csv_format(product_manager):
+    csv_file = io.BytesIO("Family;Product Name;Product ID;Price;2023-07\nÉlectronique;Montre;1;199.99;30\n".encode('latin1'))
+
+    encoding, delimiter = product_manager.sniff_csv_format(csv_file, [',', ';', '\t'])
+    assert delimiter == ';'
+
+    df = product_manager.read_csv_with_encoding(csv_file, ['utf-8'], [',', ';'])
+    assert df.shape == (1, 5)
+    assert df.iloc[0]['Family'] == 'Électronique'
+
+def test_sniff_csv_format_text_stream(product_manager):
+    csv_file = io.StringIO("Family;Product Name;Product ID;Price;2023-07\nÉlectronique;Montre;1;199.99;30\n")
+
+    encoding, delimiter = product_manager.sniff_csv_format(csv_file, [',', ';', '\t'])
+    assert delimiter == ';'
+
+    df = product_manager.read_csv_with_encoding(csv_file, ['utf-8'], [',', ';'])
+    assert df.shape == (1, 5)
+    assert df.iloc[0]['Family'] == 'Électronique'
+
 def test_load_data(product_manager, db):
     with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv') as tmp:
         tmp.write("Family,Product Name,Product ID,Price,2023-07\nElectronics,Smartwatch,1,199.99,30\n")
@@ -79,6 +80,74 @@ def test_load_data(product_manager, db):
 
     os.unlink(tmp_path)
 
+def test_load_data_month_columns(product_manager, db):
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv') as tmp:
+        tmp.write("Product Name,Product ID,Family,Price,Notes,2023-07,2023-08\nSmartwatch,1,Electronics,199.99,new,30,\n")
+        tmp_path = tmp.name
+
+    product_manager.load_data(tmp_path)
+
+    sales = db.query(Sales).all()
+    assert len(sales) == 1  # Empty months and non-month columns are skipped
+    assert sales[0].quantity == 30
+    assert sales[0].date == datetime(2023, 7, 1).date()
+
+    os.unlink(tmp_path)
+
+@pytest.mark.parametrize("parser", ['c', 'pyarrow'])
+def test_load_data_blank_family(product_manager, db, parser):
+    # Both parsers must skip rows without a family
+    pa = None if parser == 'c' else pytest.importorskip('pyarrow')
+    csv_file = io.BytesIO(b"Family,Product Name,Product ID,Price,2023-07\n,Watch,1,2.0,3\nHome,Lamp,2,10,5\n")
+
+    with patch('app.crud.pa', pa):
+        product_manager.load_data_stream(csv_file)
+
+    assert [family.name for family in db.query(Family)] == ['Home']
+    assert [product.id for product in db.query(Product)] == [2]
+    assert [sales.product_id for sales in db.query(Sales)] == [2]
+
+@pytest.mark.parametrize("parser", ['c', 'pyarrow'])
+def test_load_data_large_quantity(product_manager, db, parser):
+    pa = None if parser == 'c' else pytest.importorskip('pyarrow')
+    csv_file = io.BytesIO(b"Family,Product Name,Product ID,Price,2023-07\nHome,Lamp,1,10,16777217\n")
+
+    with patch('app.crud.pa', pa):
+        product_manager.load_data_stream(csv_file)
+
+    assert db.query(Sales).one().quantity == 16777217
+
+@pytest.mark.parametrize("parser", ['c', 'pyarrow'])
+def test_load_data_quantity_above_int32(product_manager, db, parser):
+    pa = None if parser == 'c' else pytest.importorskip('pyarrow')
+    csv_file = io.BytesIO(b"Family,Product Name,Product ID,Price,2023-07\nHome,Lamp,1,10,3000000000\n")
+
+    with patch('app.crud.pa', pa):
+        product_manager.load_data_stream(csv_file)
+
+    assert db.query(Sales).one().quantity == 3000000000
+
+@pytest.mark.parametrize("parser", ['c', 'pyarrow'])
+def test_load_data_infinite_quantity(product_manager, db, parser):
+    pa = None if parser == 'c' else pytest.importorskip('pyarrow')
+    csv_file = io.BytesIO(b"Family,Product Name,Product ID,Price,2023-07\nHome,Lamp,1,10,inf\n")
+
+    with patch('app.crud.pa', pa), pytest.raises(ValueError):
+        product_manager.load_data_stream(csv_file)
+
+def test_load_data_stream(product_manager, db):
+    csv_file = io.BytesIO(b"Family,Product Name,Product ID,Price,2023-07\nElectronics,Smartwatch,1,199.99,30\n")
+
+    product_manager.load_data_stream(csv_file)
+
+    product = db.query(Product).first()
+    assert product.name == 'Smartwatch'
+    assert product.family.name == 'Electronics'
+
+    sales = db.query(Sales).first()
+    assert sales.quantity == 30
+    assert sales.date == datetime(2023, 7, 1).date()
+
 def test_load_data_existing_family(product_manager, db):
     # Add an existing family
     family = Family(name='Electronics')
@@ -103,11 +172,8 @@ def test_load_data_existing_family(product_manager, db):
 
 def test_get_product(product_manager, db):
     family = Family(name='Electronics')
-    db.add(family)
-    db.commit()
-
-    product = Product(id=1, name='Smartphone', price=699.99, family_id=family.id)
-    db.add(product)
+    product = Product(id=1, name='Smartphone', price=699.99, family=family)
+    db.add_all([family, product])
     db.commit()
 
     retrieved_product = product_manager.get_product(1)
@@ -118,13 +184,19 @@ def test_get_product(product_manager, db):
 def test_get_nonexistent_product(product_manager):
     assert product_manager.get_product(999) is None
 
+def test_get_product_after_load_data(product_manager, db):
+    assert product_manager.get_product(1) is None
+
+    product_manager.load_data_stream(io.BytesIO(b"Family,Product Name,Product ID,Price,2023-07\nElectronics,Smartwatch,1,199.99,30\n"))
+
+    product = product_manager.get_product(1)
+    assert product.name == 'Smartwatch'
+    assert product_manager.get_family(product.family_id).name == 'Electronics'
+
 def test_update_product(product_manager, db):
     family = Family(name='Electronics')
-    db.add(family)
-    db.commit()
-
-    product = Product(id=1, name='Smartphone', price=699.99, family_id=family.id)
-    db.add(product)
+    product = Product(id=1, name='Smartphone', price=699.99, family=family)
+    db.add_all([family, product])
     db.commit()
 
     updated_product = product_manager.update_product(1, 799.99)
@@ -149,22 +221,16 @@ def test_get_nonexistent_family(product_manager):
     assert product_manager.get_family(999) is None
 
 def test_get_product_sales_last_year(product_manager, db):
-    family = Family(name='Electronics')
-    db.add(family)
-    db.commit()
-
-    product = Product(id=1, name='Smartphone', price=699.99, family_id=family.id)
-    db.add(product)
-    db.commit()
-
     now = datetime.now()
     one_year_ago = now - timedelta(days=365)
     two_years_ago = now - timedelta(days=730)
 
-    sales1 = Sales(product_id=1, date=now.date(), quantity=10)
-    sales2 = Sales(product_id=1, date=one_year_ago.date(), quantity=20)
-    sales3 = Sales(product_id=1, date=two_years_ago.date(), quantity=30)
-    db.add_all([sales1, sales2, sales3])
+    family = Family(name='Electronics')
+    product = Product(id=1, name='Smartphone', price=699.99, family=family)
+    sales1 = Sales(product=product, date=now.date(), quantity=10)
+    sales2 = Sales(product=product, date=one_year_ago.date(), quantity=20)
+    sales3 = Sales(product=product, date=two_years_ago.date(), quantity=30)
+    db.add_all([family, product, sales1, sales2, sales3])
     db.commit()
 
     total_sales = product_manager.get_product_sales_last_year(1)
@@ -172,11 +238,8 @@ def test_get_product_sales_last_year(product_manager, db):
 
 def test_get_product_sales_last_year_no_sales(product_manager, db):
     family = Family(name='Electronics')
-    db.add(family)
-    db.commit()
-
-    product = Product(id=1, name='Smartphone', price=699.99, family_id=family.id)
-    db.add(product)
+    product = Product(id=1, name='Smartphone', price=699.99, family=family)
+    db.add_all([family, product])
     db.commit()
 
     total_sales = product_manager.get_product_sales_last_year(1)
@@ -1,30 +1,28 @@
 import pytest
-from unittest.mock import MagicMock
 import pandas as pd
 import numpy as np
 from datetime import date
-from app.models import Sales, Product
+from app.models import Family, Sales, Product
 from app.sales_prediction import SalesPredictor
 
 @pytest.fixture
-def mock_db():
-    """Fixture to provide a mock database session."""
-    db = MagicMock()
-    
-    # Mock sales data
-    sales_data = [
-        (Sales(id=1, product_id=1, date=date(2023, 1, 1), quantity=10), 100.0),
-        (Sales(id=2, product_id=1, date=date(2023, 2, 1), quantity=20), 100.0),
-        (Sales(id=3, product_id=2, date=date(2023, 1, 1), quantity=15), 200.0),
-        (Sales(id=4, product_id=2, date=date(2023, 2, 1), quantity=25), 200.0)
-    ]
-    
-    # Mock query to return sales data
-    db.query.return_value.join.return_value.all.return_value = sales_data
+def db(db):
+    """Fixture to provide a database session seeded with sales data."""
+    family = Family(name='Electronics')
+    product1 = Product(id=1, name='Smartphone', price=100.0, family=family)
+    product2 = Product(id=2, name='Smartwatch', price=200.0, family=family)
+    db.add_all([
+        family, product1, product2,
+        Sales(id=1, product=product1, date=date(2023, 1, 1), quantity=10),
+        Sales(id=2, product=product1, date=date(2023, 2, 1), quantity=20),
+        Sales(id=3, product=product2, date=date(2023, 1, 1), quantity=15),
+        Sales(id=4, product=product2, date=date(2023, 2, 1), quantity=25)
+    ])
+    db.flush()
     return db
 
-def test_load_sales_data(mock_db):
-    predictor = SalesPredictor(mock_db)
+def test_load_sales_data(db):
+    predictor = SalesPredictor(db)
     df = predictor.load_sales_data()
     
     assert isinstance(df, pd.DataFrame)
@@ -32,8 +30,18 @@ def test_load_sales_data(mock_db):
     assert 'days_since_start' in df.columns
     assert 'revenue' in df.columns
 
-def test_train_model_quantity(mock_db):
-    predictor = SalesPredictor(mock_db)
+def test_load_sales_data_empty(db):
+    db.query(Sales).delete()
+    predictor = SalesPredictor(db)
+    df = predictor.load_sales_data()
+
+    assert df.empty
+    assert len(df.columns) == 6
+    with pytest.raises(ValueError):
+        predictor.train_model('quantity')
+
+def test_train_model_quantity(db):
+    predictor = SalesPredictor(db)
     predictor.load_sales_data()
     predictor.train_model('quantity')
     
@@ -41,8 +49,8 @@ def test_train_model_quantity(mock_db):
     assert hasattr(predictor, 'X_test_quantity')
     assert hasattr(predictor, 'y_test_quantity')
 
-def test_train_model_revenue(mock_db):
-    predictor = SalesPredictor(mock_db)
+def test_train_model_revenue(db):
+    predictor = SalesPredictor(db)
     predictor.load_sales_data()
     predictor.train_model('revenue')
     
@@ -50,8 +58,8 @@ def test_train_model_revenue(mock_db):
     assert hasattr(predictor, 'X_test_revenue')
     assert hasattr(predictor, 'y_test_revenue')
 
-def test_evaluate_model_quantity(mock_db):
-    predictor = SalesPredictor(mock_db)
+def test_evaluate_model_quantity(db):
+    predictor = SalesPredictor(db)
     predictor.load_sales_data()
     predictor.train_model('quantity')
     
@@ -64,8 +72,8 @@ def test_evaluate_model_quantity(mock_db):
     assert mse >= 0
     assert rmse >= 0
 
-def test_evaluate_model_revenue(mock_db):
-    predictor = SalesPredictor(mock_db)
+def test_evaluate_model_revenue(db):
+    predictor = SalesPredictor(db)
     predictor.load_sales_data()
     predictor.train_model('revenue')
     
@@ -78,8 +86,8 @@ def test_evaluate_model_revenue(mock_db):
     assert mse >= 0
     assert rmse >= 0
 
-def test_generate_prediction_report(mock_db):
-    predictor = SalesPredictor(mock_db)
+def test_generate_prediction_report(db):
+    predictor = SalesPredictor(db)
     predictor.load_sales_data()
     predictor.train_model('quantity')
     predictor.train_model('revenue')
@@ -94,9 +102,14 @@ def test_generate_prediction_report(mock_db):
     assert 'predicted_revenue' in report_df.columns
     assert 'quantity_error' in report_df.columns
     assert 'revenue_error' in report_df.columns
+    assert pd.api.types.is_integer_dtype(report_df['actual_quantity'])
+    assert report_df['actual_revenue'].dtype == np.float64
+
+    with open('output/prediction_report.csv') as f:
+        assert f.readline() == ','.join(report_df.columns) + '\n'
 
-def test_run(mock_db, capsys):
-    predictor = SalesPredictor(mock_db)
+def test_run(db, capsys):
+    predictor = SalesPredictor(db)
     predictor.run()
     
     captured = capsys.readouterr()